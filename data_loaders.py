@@ -0,0 +1,45 @@
+# KDV input file loaders, shared by the gurobi and open source models
+import copy
+import functools
+import os
+import yaml
+import numpy as np
+import pandas as pd
+
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
+    """Read a csv file with the pyarrow parser, falling back to the C parser"""
+    try:
+        return pd.read_csv(path, engine="pyarrow", **kwargs)
+    except ImportError:
+        return pd.read_csv(path, engine="c", low_memory=False, **kwargs)
+
+# use the libyaml parser when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Parsed files are cached on (path, modification time), so repeated model
+# builds reuse them while edited input files are still picked up.
+@functools.lru_cache(maxsize=8)
+def _load_config(path: str, mtime: float) -> dict:
+    with open(path, "rb") as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
+@functools.lru_cache(maxsize=8)
+def _load_preferences(path: str, mtime: float) -> pd.DataFrame:
+    return _read_csv(path, index_col="slot").astype(np.float64)
+
+@functools.lru_cache(maxsize=8)
+def _load_experiences(path: str, mtime: float) -> pd.DataFrame:
+    # only downcast columns that hold whole numbers, so fractional months survive
+    return _read_csv(path).apply(pd.to_numeric, downcast="integer")
+
+def load_config(path: str) -> dict:
+    """Load the configuration file"""
+    return copy.deepcopy(_load_config(path, os.path.getmtime(path)))
+
+def load_preferences(path: str) -> pd.DataFrame:
+    """Load the preferences file, indexed by slot"""
+    return _load_preferences(path, os.path.getmtime(path)).copy()
+
+def load_experiences(path: str) -> pd.DataFrame:
+    """Load the experiences file"""
+    return _load_experiences(path, os.path.getmtime(path)).copy()
@@ -1,11 +1,11 @@
 # KDV model object, open source version
 # last edited 20230428 by @vankesteren
 import mip
-import yaml
 import pandas as pd
 import numpy as np
 from datetime import datetime as dt
 import os
+import data_loaders
 
 class KDVModel:
     def __init__(self, config_file: str, preferences_file: str, experiences_file: str):
@@ -25,33 +25,44 @@ class KDVModel:
     # Data Loading methods
     def load_config(self, config_file: str) -> None:
         """Load the configuration file and store it in the object"""
-        self.config = yaml.safe_load(open(config_file))
+        self.config = data_loaders.load_config(config_file)
 
     def load_preferences(self, preferences_file: str) -> None:
         """Load the preferences file and store it in the object"""
-        self.prefs = pd.read_csv(preferences_file, index_col="slot")
+        self.prefs = data_loaders.load_preferences(preferences_file)
         self.slot_names = self.prefs.index.to_list()
         self.person_names = self.prefs.columns.to_list()
-        self.prefs_normed = self.prefs / self.prefs.sum(axis=0) #* len(self.slot_names)
-        self.prefs_np = self.prefs_normed.to_numpy()
+        # normalize in numpy; the DataFrame is only kept for its slot and person labels.
+        # numpy sums in a different order than pandas, so results can differ in the last digit
+        prefs = self.prefs.to_numpy(dtype=np.float64)
+        prefs_normed = prefs / prefs.sum(axis=0, keepdims=True) #* len(self.slot_names)
+        # C-contiguous, so the reshape(-1) calls on it are views rather than copies
+        self.prefs_np = np.ascontiguousarray(prefs_normed)
+        self._desirability = pd.DataFrame({"desirability": self.prefs_np.sum(axis=1) / len(self.person_names) * len(self.slot_names)}, index=self.prefs.index)
+        self._flexibility = pd.DataFrame({"flexibility": 1 / self.prefs_np.max(axis=0)}, index=self.prefs.columns)
 
     def load_experiences(self, experiences_file: str) -> None:
         """Load the experiences file and store it in the object"""
-        exp_df = pd.read_csv(experiences_file)
-        exp_dict = {k: v for k, v in zip(exp_df.columns, exp_df.values[0])}
-        self.exp_indicator = np.array([int(exp_dict[n] > self.config["experience_months"]) for n in self.person_names])
+        exp_df = data_loaders.load_experiences(experiences_file)
+        exp_months = exp_df.iloc[0].loc[self.person_names].to_numpy()
+        self.exp_indicator = (exp_months > self.config["experience_months"]).astype(np.int8)
 
     # Model setup methods
     def set_variables(self) -> None:
-        self.var_names = np.array([[f"{n}_{s}" for n in self.person_names] for s in self.slot_names])
         self.assignments = self.model.add_var_tensor(self.prefs.shape, var_type=mip.BINARY, name="assignments")
+        self._flat_vars = self.assignments.reshape(-1).tolist()
         self.slots_per_person = self.assignments.sum(axis=0)
         self.persons_per_slot = self.assignments.sum(axis=1)
         self.experienced_per_slot = self.assignments @ self.exp_indicator
 
     def set_objective(self) -> None:
-        self.discrepancy = self.assignments - self.prefs_np
-        self.model.objective = mip.minimize(mip.xsum(d.item() for d in np.nditer(self.discrepancy, flags=["refs_ok"])))
+        """Minimize the sum of squared discrepancies between assignments and preferences.
+
+        mip has no quadratic objectives, but for binary x we have x^2 = x, so
+        sum((x - p)^2) equals sum((1 - 2p) * x) up to a constant.
+        """
+        coef = (1.0 - 2.0 * self.prefs_np).reshape(-1).tolist()
+        self.model.objective = mip.minimize(mip.xsum(c * v for c, v in zip(coef, self._flat_vars)))
     
     def set_constraints(self) -> None:
         self.constr_no_unavailable_slots()
@@ -62,25 +73,29 @@ class KDVModel:
     # Constraint methods
     def constr_no_unavailable_slots(self) -> None:
         """Make sure that persons cannot be assigned to slots they are not available for."""
-        for idx, val in np.ndenumerate(self.prefs_np):
-            if val == 0:
-                self.model += self.assignments[idx] == 0, f"unavail_{self.var_names[idx]}"
+        # fix the unavailable variables to 0 through their bounds instead of constraints
+        for k in np.flatnonzero(self.prefs_np == 0):
+            self._flat_vars[k].ub = 0
 
     def constr_slots_per_person(self) -> None:
         """Ensure that persons have at most slots_per_person_max slots assigned to them."""
-        for i in range(len(self.person_names)):
-            self.model += self.slots_per_person[i] <= self.config["slots_per_person_max"], f"maxslots_{self.person_names[i]}"
+        max_slots = self.config["slots_per_person_max"]
+        for name, n_slots in zip(self.person_names, self.slots_per_person):
+            self.model += n_slots <= max_slots, f"maxslots_{name}"
             
     def constr_persons_per_slot(self) -> None:
         """Ensure at least persons_per_slot_min and at most persons_per_slot_max persons per slot."""
-        for i in range(len(self.slot_names)):
-            self.model += self.persons_per_slot[i] >= self.config["persons_per_slot_min"], f"minpersons_{self.slot_names[i]}"
-            self.model += self.persons_per_slot[i] <= self.config["persons_per_slot_max"], f"maxpersons_{self.slot_names[i]}"
+        min_persons = self.config["persons_per_slot_min"]
+        max_persons = self.config["persons_per_slot_max"]
+        for name, n_persons in zip(self.slot_names, self.persons_per_slot):
+            self.model += n_persons >= min_persons, f"minpersons_{name}"
+            self.model += n_persons <= max_persons, f"maxpersons_{name}"
             
     def constr_experienced_persons(self) -> None:
         """Ensure at least min_experienced_persons of experienced persons per slot"""
-        for i in range(len(self.slot_names)):
-            self.model += self.experienced_per_slot[i] >= self.config["min_experienced_persons"], f"expperson_{self.slot_names[i]}"
+        min_experienced = self.config["min_experienced_persons"]
+        for name, n_experienced in zip(self.slot_names, self.experienced_per_slot):
+            self.model += n_experienced >= min_experienced, f"expperson_{name}"
 
     # Model convenience methods
     def optimize(self, *args, **kwargs) -> None: 
@@ -96,17 +111,16 @@ class KDVModel:
     # Model output methods
     def slot_schedule(self) -> pd.DataFrame:
         assert self.converged()
-        res = self.prefs.copy()
-        res[:] = np.reshape([v.item().x for v in np.nditer(self.assignments, flags=["refs_ok"])], self.assignments.shape) 
-        return res
+        assigned = np.fromiter((round(v.x) for v in self._flat_vars), dtype=np.int8).reshape(self.assignments.shape)
+        return pd.DataFrame(assigned, index=self.prefs.index, columns=self.prefs.columns)
 
     def slot_desirability(self) -> pd.DataFrame:
         """if everyone would fill out the same number everywhere, this would be 1"""
-        return pd.DataFrame({"desirability": self.prefs_normed.sum(axis=1) / len(self.person_names) * len(self.slot_names)})
+        return self._desirability.copy()
     
     def person_flexibility(self) -> pd.DataFrame:
         """0.1 = only one slot available, 1.0 = all available, no preference"""
-        return pd.DataFrame({"flexibility": 1 / self.prefs_normed.max(axis=0)})
+        return self._flexibility.copy()
     
     # Storing model output
     def save_output(self) -> str:
@@ -115,12 +129,15 @@ class KDVModel:
 
         # Create subfolder for this run
         folder_name = os.path.join(self.config["output_folder"], self.curtime.strftime('%Y%m%d_%H%M%S'))
-        if not os.path.exists(folder_name):
-            os.makedirs(folder_name)
+        os.makedirs(folder_name, exist_ok=True)
 
         # Store files in folder
-        self.slot_schedule().to_csv(os.path.join(folder_name, "assignments.csv"))
-        self.slot_desirability().to_csv(os.path.join(folder_name, "desirability.csv"))
-        self.person_flexibility().to_csv(os.path.join(folder_name, "flexibility.csv"))
+        outputs = {
+            "assignments.csv": self.slot_schedule(),
+            "desirability.csv": self.slot_desirability(),
+            "flexibility.csv": self.person_flexibility(),
+        }
+        for file_name, df in outputs.items():
+            df.to_csv(os.path.join(folder_name, file_name))
 
         return folder_name